@@ -1,8 +1,13 @@
 import bpy
 import os
+import sys
+import argparse
+import shutil
+import tempfile
 import numpy as np
-import json
+import orjson
 import mathutils
+from concurrent.futures import ThreadPoolExecutor
 import plotly.graph_objs as go
 from plotly.subplots import make_subplots
 from plotly.io import write_html
@@ -12,63 +17,23 @@ from pyblend.utils import BlenderRemover, ArgumentParserForBlender
 from pyblend.object import load_obj, create_plane
 from pyblend.transform import look_at, random_loc
 
-def load_texture(texture_path):
-    """Load texture image from file."""
-    if not os.path.exists(texture_path):
-        raise FileNotFoundError(f"Texture image '{texture_path}' not found.")
-    
-    mat = bpy.data.materials.new(name="TextureMaterial")
-    mat.use_nodes = True
-    nodes = mat.node_tree.nodes
-
-    for node in nodes:
-        nodes.remove(node)
-
-    texture_node = nodes.new(type='ShaderNodeTexImage')
-    texture_node.image = bpy.data.images.load(texture_path)
-
-    principled_bsdf = nodes.new(type='ShaderNodeBsdfPrincipled')
-    output_node = nodes.new(type='ShaderNodeOutputMaterial')
-    links = mat.node_tree.links
-    links.new(texture_node.outputs['Color'], principled_bsdf.inputs['Base Color'])
-    links.new(principled_bsdf.outputs['BSDF'], output_node.inputs['Surface'])
-
-    return mat
-
-def get_camera_extrinsics(camera):
-    """Returns the camera extrinsics (pose) as a transformation matrix."""
-    c2w_matrix = camera.matrix_world
-    c2w_list = [list(row) for row in c2w_matrix]
-    return {"transform_matrix": c2w_list}
-
-def get_camera_intrinsics(camera):
-    """Returns the camera intrinsics (focal length) as a list."""
-    focal_length = camera.data.lens
-    return {"focal_length": focal_length}
-
-def get_camera_rotation(camera):
-    """Returns the camera rotation as a scalar value."""
-    return camera.rotation_euler.to_quaternion().angle
+# Blender does not put the script's directory on sys.path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from renderer_util import (
+    load_texture, get_camera_intrinsics, rotation_angles,
+    world_bbox, get_object_vertices, sample_sphere_positions, spiral_positions, look_at_matrices
+)
 
 def get_bounding_box(obj):
-    # Get local bounding box coordinates
-    local_bbox = np.array([obj.matrix_world @ mathutils.Vector(corner) for corner in obj.bound_box])
-    
-    # Get min and max coordinates
-    min_corner = np.min(local_bbox, axis=0)
-    max_corner = np.max(local_bbox, axis=0)
-    
+    min_corner, max_corner = world_bbox(obj)
+
     print("Bounding Box Min Corner:", min_corner)
     print("Bounding Box Max Corner:", max_corner)
 
 def normalize_obj(obj):
     """Normalize object to fit within a unit sphere."""
     # Calculate the bounding box in world coordinates
-    local_bbox = np.array([obj.matrix_world @ mathutils.Vector(corner) for corner in obj.bound_box])
-    
-    # Get min and max corners
-    min_corner = np.min(local_bbox, axis=0)
-    max_corner = np.max(local_bbox, axis=0)
+    min_corner, max_corner = world_bbox(obj)
     
     # Compute the size of the bounding box
     size = np.max(max_corner - min_corner)
@@ -86,23 +51,23 @@ def normalize_obj(obj):
     # Update the object’s transformation matrix
     bpy.context.view_layer.update()
 
-    # Verify bounding box after normalization
-    get_bounding_box(obj)
-
-def get_object_vertices(obj):
-    """Returns the vertices of the object in world space."""
-    vertices = []
-    for v in obj.data.vertices:
-        world_vertex = obj.matrix_world @ v.co
-        vertices.append((world_vertex.x, world_vertex.y, world_vertex.z))
-    return vertices
+    if os.environ.get('PYBLEND_DEBUG'):
+        print("Bounding Box Min Corner (before normalization):", min_corner)
+        print("Bounding Box Max Corner (before normalization):", max_corner)
 
-def plot_vertices_and_cameras(vertices, camera_positions, lights, output_path):
+def plot_vertices_and_cameras(vertices, camera_positions, lights, output_path, max_vertices=5000):
 
     """Plot the vertices of the object, camera positions, and light positions, and save as HTML."""
-    x_verts, y_verts, z_verts = zip(*vertices) if vertices else ([], [], [])
-    x_cams, y_cams, z_cams = zip(*camera_positions) if camera_positions else ([], [], [])
-    x_lights, y_lights, z_lights = zip(*lights) if lights else ([], [], [])
+    # Randomly subsample the vertices, the plot is only a diagnostic
+    verts = np.asarray(vertices).reshape(-1, 3)
+    if len(verts) > max_vertices:
+        idx = np.random.default_rng(0).choice(len(verts), size=max_vertices, replace=False)
+        verts = verts[idx]
+    x_verts, y_verts, z_verts = verts[:, 0], verts[:, 1], verts[:, 2]
+    cams = np.array(camera_positions, dtype=np.float64).reshape(-1, 3)
+    x_cams, y_cams, z_cams = cams[:, 0], cams[:, 1], cams[:, 2]
+    light_locs = np.array(lights, dtype=np.float64).reshape(-1, 3)
+    x_lights, y_lights, z_lights = light_locs[:, 0], light_locs[:, 1], light_locs[:, 2]
     
     fig = make_subplots(
         rows=1, cols=1,
@@ -158,10 +123,38 @@ def plot_vertices_and_cameras(vertices, camera_positions, lights, output_path):
     )
     
     fig.update_layout(height=1600, width=1600, title_text="Object Vertices, Camera Positions, and Lights")
-    write_html(fig, file=output_path, auto_open=False)
+    write_html(fig, file=output_path, include_plotlyjs='cdn', full_html=True, validate=False, auto_open=False)
+
+def parse_shard(value):
+    """Parses a shard spec of the form 'index/count'."""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid shard '{value}', expected index/count.")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"Invalid shard '{value}', index must be in [0, count).")
+    return index, count
+
+def config_frame_reuse(samples=None):
+    """Configure the scene for many renders that differ only in camera pose."""
+    scene = bpy.context.scene
+    # Keep scene data between renders instead of rebuilding it every frame
+    scene.render.use_persistent_data = True
+
+    # Only the combined pass is saved
+    view_layer = bpy.context.view_layer
+    view_layer.use_pass_z = False
+    view_layer.use_pass_mist = False
+    view_layer.use_pass_normal = False
+
+    # Fewer samples are only requested explicitly, and are paired with the denoiser
+    if scene.render.engine == 'CYCLES' and samples is not None:
+        scene.cycles.samples = samples
+        scene.cycles.use_denoising = True
 
 def render_and_save_extrinsics(args):
     config_render(res_x=800, res_y=800, transparent=True)
+    config_frame_reuse(args.samples)
     remover = BlenderRemover()
     remover.clear_all()
     config_world(0.3)
@@ -193,111 +186,83 @@ def render_and_save_extrinsics(args):
 
     camera = bpy.data.objects["Camera"]
 
-    if "Track To" not in camera.constraints:
-        track_to_constraint = camera.constraints.new(type='TRACK_TO')
-        track_to_constraint.track_axis = 'TRACK_NEGATIVE_Z'
-        track_to_constraint.up_axis = 'UP_Y'
-        track_to_constraint.target = obj
+    # The full camera pose is set per frame, so a tracking constraint would only override it
+    if "Track To" in camera.constraints:
+        camera.constraints.remove(camera.constraints["Track To"])
 
     get_bounding_box(obj)
 
-    extrinsics_list = []
-    intrinsics_list = []
-    frames_list = []
-    camera_positions = []
-
-    # Output directory setup with respect to split
+    # Output directory setup, with the split subdirectory created up front
     output_dir = os.path.join(args.output_dir, f"{args.name}_{args.radius}_{args.num}")
-    os.makedirs(output_dir, exist_ok=True)
+    split_dir = os.path.join(output_dir, args.split)
+    os.makedirs(split_dir, exist_ok=True)
+    name_fmt = f"{args.name}_{{:04d}}.png"
 
+    # Camera intrinsics are constant across frames, so read them once
+    focal_length = get_camera_intrinsics(camera)['focal_length']
     camera_angle_x = camera.data.angle_x
     camera_angle_y = camera.data.angle_y
 
+    # Camera placement: random on a sphere for training, spiral for testing
     if args.split == 'train':
-        # Random camera placement for training
-        for i in range(args.num):
-            theta = np.random.uniform(0, 2 * np.pi)
-            phi = np.random.uniform(0, np.pi)
-            x = args.radius * np.sin(phi) * np.cos(theta)
-            y = args.radius * np.sin(phi) * np.sin(theta)
-            z = args.radius * np.cos(phi)
-            camera.location = (x, y, z)
-            look_at(camera, obj.location)
-            render_image_path = os.path.join(output_dir, f"{args.split}", f"{args.name}_{i:04d}.png")
-            render_image(render_image_path)
-
-            extrinsics = get_camera_extrinsics(camera)
-            extrinsics['frame'] = f"{args.name}_{i:04d}.png"
-            extrinsics_list.append(extrinsics)
-
-            intrinsics = get_camera_intrinsics(camera)
-            intrinsics_list.append(intrinsics)
-
-            rotation = get_camera_rotation(camera)
-            frame_info = {
-                "file_path": f"./{args.split}/{args.name}_{i:04d}.png",
-                "rotation": rotation,
-                "transform_matrix": extrinsics['transform_matrix'],
-                "focal_length": intrinsics['focal_length'],
-                "camera_angle_x": camera_angle_x,
-                "camera_angle_y": camera_angle_y
-            }
-            frames_list.append(frame_info)
-
-            camera_positions.append(camera.location.copy())
-
+        positions = sample_sphere_positions(args.num, args.radius, seed=args.seed)
     elif args.split == 'test':
-        # Spiral camera placement
-        num_cameras = args.num
-        radius = args.radius
-        height_step = 2 * radius / num_cameras  # Adjust height step to spread the spiral along the z-axis
-
-        for i in range(num_cameras):
-            angle = np.linspace(0, 2 * np.pi, num_cameras, endpoint=False)[i]
-            height = i * height_step - radius  # Spread the spiral along the z-axis
-
-            x = radius * np.cos(angle)
-            y = radius * np.sin(angle)
-            z = height
-
-            camera.location = (x, y, z)
-            look_at(camera, obj.location)
-            
-            render_image_path = os.path.join(output_dir, f"{args.split}", f"{args.name}_{i:04d}.png")
-            render_image(render_image_path)
-
-            extrinsics = get_camera_extrinsics(camera)
-            extrinsics['frame'] = f"{args.name}_{i:04d}.png"
-            extrinsics_list.append(extrinsics)
-
-            intrinsics = get_camera_intrinsics(camera)
-            intrinsics_list.append(intrinsics)
-
-            rotation = get_camera_rotation(camera)
-            frame_info = {
-                "file_path": f"./{args.split}/{args.name}_{i:04d}.png",
-                "rotation": rotation,
-                "transform_matrix": extrinsics['transform_matrix'],
-                "focal_length": intrinsics['focal_length'],
-                "camera_angle_x": camera_angle_x,
-                "camera_angle_y": camera_angle_y
-            }
-            frames_list.append(frame_info)
-
-            camera_positions.append(camera.location.copy())
+        positions = spiral_positions(args.num, args.radius)
+    camera_matrices = look_at_matrices(positions, obj.location)
+
+    # Render only this process's slice of the frames when sharded
+    shard_index, num_shards = args.shard
+    frame_indices = np.array_split(np.arange(args.num), num_shards)[shard_index]
+    shard_suffix = f"_shard{shard_index}" if num_shards > 1 else ""
+    fnames = [name_fmt.format(i) for i in frame_indices]
+
+    # Render into a RAM-backed staging dir and move frames to the output dir in the
+    # background, so disk writes overlap with setting up and rendering the next frame
+    staging_dir = tempfile.mkdtemp(dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+    writer = ThreadPoolExecutor(max_workers=2)
+    pending_writes = []
+
+    try:
+        # The render loop only moves the camera and renders, all metadata is precomputed
+        for i, fname in zip(frame_indices, fnames):
+            camera.matrix_world = mathutils.Matrix(camera_matrices[i])
+            staged_image_path = os.path.join(staging_dir, fname)
+            render_image(staged_image_path)
+            pending_writes.append(writer.submit(shutil.move, staged_image_path, os.path.join(split_dir, fname)))
+    finally:
+        # Drain the writer and free the RAM-backed staging dir even if a render fails
+        writer.shutdown(wait=True)
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    # Surface any failed image writes before saving metadata
+    for write in pending_writes:
+        write.result()
 
     # Save transform JSON
-    transform_json_path = os.path.join(output_dir, f"transforms_{args.split}.json")
-    with open(transform_json_path, 'w') as outfile:
-        json.dump(frames_list, outfile, indent=4)
+    rotations = rotation_angles(camera_matrices[frame_indices])
+    frames_list = [
+        {
+            "file_path": f"./{args.split}/{fname}",
+            "rotation": rotation,
+            "transform_matrix": camera_matrices[i],
+            "focal_length": focal_length,
+            "camera_angle_x": camera_angle_x,
+            "camera_angle_y": camera_angle_y
+        }
+        for i, fname, rotation in zip(frame_indices, fnames, rotations.tolist())
+    ]
+    transform_json_path = os.path.join(output_dir, f"transforms_{args.split}{shard_suffix}.json")
+    with open(transform_json_path, 'wb') as outfile:
+        outfile.write(orjson.dumps(frames_list, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
     
     print(f"Transform JSON saved to {transform_json_path}")
 
-    # Plotting
-    vertices = get_object_vertices(obj)
-    light_positions = [spot_light.location]
-    plot_output_path = os.path.join(output_dir, f"plot_{args.split}.html")
-    plot_vertices_and_cameras(vertices, camera_positions, light_positions, plot_output_path)
+    # Optional diagnostic plot of the scene layout
+    if args.plot:
+        vertices = get_object_vertices(obj)
+        light_positions = [spot_light.location]
+        plot_output_path = os.path.join(output_dir, f"plot_{args.split}{shard_suffix}.html")
+        plot_vertices_and_cameras(vertices, positions[frame_indices], light_positions, plot_output_path)
 
 if __name__ == "__main__":
     parser = ArgumentParserForBlender()
@@ -307,6 +272,10 @@ if __name__ == "__main__":
     parser.add_argument('--output_dir', type=str, help='Output directory', required=True)
     parser.add_argument('--data_dir', type=str, help='Input data directory', required=True)
     parser.add_argument('--radius', type=float, help='Radius for camera placement', required=True)
+    parser.add_argument('--seed', type=int, help='Random seed for camera placement', default=None)
+    parser.add_argument('--samples', type=int, help='Cycles samples per pixel (denoised)', default=None)
+    parser.add_argument('--shard', type=parse_shard, help='Shard of frames to render as index/count, e.g. 0/4', default=(0, 1))
+    parser.add_argument('--plot', action='store_true', help='Save an HTML plot of the vertices, cameras, and lights')
     args = parser.parse_args()
 
     render_and_save_extrinsics(args)
@@ -0,0 +1,108 @@
+"""Rendering helpers shared by the dataset rendering scripts."""
+import bpy
+import os
+import mathutils
+import numpy as np
+
+def load_texture(texture_path):
+    """Load texture image from file."""
+    if not os.path.exists(texture_path):
+        raise FileNotFoundError(f"Texture image '{texture_path}' not found.")
+    
+    mat = bpy.data.materials.new(name="TextureMaterial")
+    mat.use_nodes = True
+    nodes = mat.node_tree.nodes
+
+    for node in nodes:
+        nodes.remove(node)
+
+    texture_node = nodes.new(type='ShaderNodeTexImage')
+    texture_node.image = bpy.data.images.load(texture_path)
+
+    principled_bsdf = nodes.new(type='ShaderNodeBsdfPrincipled')
+    output_node = nodes.new(type='ShaderNodeOutputMaterial')
+    links = mat.node_tree.links
+    links.new(texture_node.outputs['Color'], principled_bsdf.inputs['Base Color'])
+    links.new(principled_bsdf.outputs['BSDF'], output_node.inputs['Surface'])
+
+    return mat
+
+def get_camera_extrinsics(camera):
+    """Returns the camera extrinsics (pose) as a 4x4 transformation matrix."""
+    return {"transform_matrix": np.array(camera.matrix_world, dtype=np.float64)}
+
+def get_camera_intrinsics(camera):
+    """Returns the camera intrinsics (focal length) as a list."""
+    focal_length = camera.data.lens
+    return {"focal_length": focal_length}
+
+def rotation_angles(matrices):
+    """Returns the camera rotation scalar of each (N, 4, 4) camera-to-world matrix.
+
+    Matches `camera.rotation_euler.to_quaternion().angle`, the value written per frame.
+    """
+    return np.array([mathutils.Matrix(m).to_euler().to_quaternion().angle for m in matrices])
+
+def world_bbox(obj):
+    """Returns the min and max corners of the object's bounding box in world space."""
+    # Copy the 8 corners in one call instead of building a Vector per corner
+    corners = np.array(obj.bound_box, dtype=np.float64)
+    matrix_world = np.asarray(obj.matrix_world, dtype=np.float64)
+
+    # Transform all 8 corners in a single matmul
+    world_corners = corners @ matrix_world[:3, :3].T + matrix_world[:3, 3]
+    return world_corners.min(axis=0), world_corners.max(axis=0)
+
+def get_object_vertices(obj):
+    """Returns the vertices of the object in world space as an (N, 3) array."""
+    mesh_vertices = obj.data.vertices
+    coords = np.empty(len(mesh_vertices) * 3, dtype=np.float32)
+    mesh_vertices.foreach_get('co', coords)
+    coords = coords.reshape(-1, 3)
+
+    # Apply the world transform to all vertices in a single matmul
+    matrix_world = np.asarray(obj.matrix_world, dtype=np.float32)
+    return coords @ matrix_world[:3, :3].T + matrix_world[:3, 3]
+
+def sample_sphere_positions(num, radius, seed=None):
+    """Returns (num, 3) camera positions sampled at random on a sphere."""
+    rng = np.random.default_rng(seed)
+    theta = rng.uniform(0, 2 * np.pi, num)
+    phi = rng.uniform(0, np.pi, num)
+    sin_phi = np.sin(phi)
+    return np.stack([
+        radius * sin_phi * np.cos(theta),
+        radius * sin_phi * np.sin(theta),
+        radius * np.cos(phi)
+    ], axis=1)
+
+def spiral_positions(num, radius):
+    """Returns (num, 3) camera positions along a spiral around the z-axis."""
+    height_step = 2 * radius / num  # Adjust height step to spread the spiral along the z-axis
+    angles = np.linspace(0, 2 * np.pi, num, endpoint=False)
+    heights = np.arange(num) * height_step - radius
+    return np.column_stack([radius * np.cos(angles), radius * np.sin(angles), heights])
+
+def look_at_matrices(positions, target, up=(0.0, 0.0, 1.0)):
+    """Returns (N, 4, 4) camera-to-world matrices looking from each position at the target.
+
+    Follows Blender's camera convention: the camera looks down its local -Z axis with +Y up.
+    """
+    positions = np.asarray(positions, dtype=np.float64)
+    forward = np.asarray(target, dtype=np.float64) - positions
+    forward /= np.linalg.norm(forward, axis=1, keepdims=True)
+
+    right = np.cross(forward, up)
+    # Fall back to the world Y axis where the view direction is parallel to `up`
+    degenerate = np.linalg.norm(right, axis=1) < 1e-8
+    right[degenerate] = np.cross(forward[degenerate], (0.0, 1.0, 0.0))
+    right /= np.linalg.norm(right, axis=1, keepdims=True)
+    cam_up = np.cross(right, forward)
+
+    mats = np.zeros((len(positions), 4, 4))
+    mats[:, :3, 0] = right
+    mats[:, :3, 1] = cam_up
+    mats[:, :3, 2] = -forward
+    mats[:, :3, 3] = positions
+    mats[:, 3, 3] = 1.0
+    return mats
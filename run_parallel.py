@@ -0,0 +1,93 @@
+import argparse
+import os
+import secrets
+import subprocess
+import sys
+
+import orjson
+
+
+def visible_devices(num_gpus):
+    """Returns the CUDA device ids available to this job, e.g. those allocated by SLURM."""
+    inherited = os.environ.get('CUDA_VISIBLE_DEVICES')
+    if inherited is None:
+        return [str(index) for index in range(num_gpus)]
+    return [device.strip() for device in inherited.split(',') if device.strip()]
+
+
+def launch_shards(args, devices):
+    """Launch one Blender process per GPU, each rendering a disjoint shard of the frames."""
+    processes = []
+    for shard_index in range(args.num_gpus):
+        env = os.environ.copy()
+        env['CUDA_VISIBLE_DEVICES'] = devices[shard_index]
+        cmd = [
+            args.blender, '-b', '-P', args.script, '--',
+            '--data_dir', args.data_dir,
+            '--name', args.name,
+            '--output_dir', args.output_dir,
+            '--split', args.split,
+            '--radius', str(args.radius),
+            '--num', str(args.num),
+            '--shard', f"{shard_index}/{args.num_gpus}",
+            '--seed', str(args.seed),
+        ]
+        if args.samples is not None:
+            cmd += ['--samples', str(args.samples)]
+        if args.plot:
+            cmd.append('--plot')
+        processes.append(subprocess.Popen(cmd, env=env))
+
+    failed = [shard_index for shard_index, p in enumerate(processes) if p.wait() != 0]
+    if failed:
+        raise RuntimeError(f"Rendering failed for shard(s) {failed}.")
+
+
+def merge_shards(args):
+    """Concatenate the per-shard transform JSON files into a single transforms file."""
+    output_dir = os.path.join(args.output_dir, f"{args.name}_{args.radius}_{args.num}")
+    frames_list = []
+    for shard_index in range(args.num_gpus):
+        shard_path = os.path.join(output_dir, f"transforms_{args.split}_shard{shard_index}.json")
+        with open(shard_path, 'rb') as infile:
+            frames_list.extend(orjson.loads(infile.read()))
+        os.remove(shard_path)
+
+    transform_json_path = os.path.join(output_dir, f"transforms_{args.split}.json")
+    with open(transform_json_path, 'wb') as outfile:
+        outfile.write(orjson.dumps(frames_list, option=orjson.OPT_INDENT_2))
+
+    print(f"Transform JSON saved to {transform_json_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Render a dataset split across multiple Blender processes/GPUs.')
+    parser.add_argument('--blender', type=str, help='Path to the Blender executable', default='blender')
+    parser.add_argument('--script', type=str, help='Render script to run in each process', default='google-renderer.py')
+    parser.add_argument('--num_gpus', type=int, help='Number of GPUs (one Blender process each)', required=True)
+    parser.add_argument('--name', type=str, help='Dataset name', required=True)
+    parser.add_argument('--num', type=int, help='Number of images to render', required=True)
+    parser.add_argument('--split', type=str, help='Dataset split (train/test)', choices=['train', 'test'], required=True)
+    parser.add_argument('--output_dir', type=str, help='Output directory', required=True)
+    parser.add_argument('--data_dir', type=str, help='Input data directory', required=True)
+    parser.add_argument('--radius', type=float, help='Radius for camera placement', required=True)
+    parser.add_argument('--seed', type=int, help='Random seed for camera placement', default=None)
+    parser.add_argument('--samples', type=int, help='Cycles samples per pixel (denoised)', default=None)
+    parser.add_argument('--plot', action='store_true', help='Save an HTML plot of the vertices, cameras, and lights per shard')
+    args = parser.parse_args()
+
+    if args.num_gpus < 1:
+        sys.exit("--num_gpus must be at least 1.")
+
+    devices = visible_devices(args.num_gpus)
+    if args.num_gpus > len(devices):
+        sys.exit(f"--num_gpus is {args.num_gpus} but only {len(devices)} GPU(s) are visible: {devices}.")
+
+    # Every shard must sample the same camera positions, so pick one seed for all of them
+    if args.seed is None:
+        args.seed = secrets.randbits(32)
+        print(f"Using random seed {args.seed}")
+
+    launch_shards(args, devices)
+    if args.num_gpus > 1:
+        merge_shards(args)